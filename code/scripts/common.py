@@ -0,0 +1,343 @@
+import os
+import csv
+import json
+import functools
+import itertools
+from collections import deque
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    import json as orjson
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+import numpy as np
+
+# Размер буфера при записи CSV-отчетов
+CSV_BUFFER_SIZE = 1 << 20
+
+
+def _raw_header(stage_names) -> list:
+    """
+    Формирует заголовок таблицы сырых таймингов.
+    """
+    return ['pair', 'total_time_ns'] + [f'{stage}_time_ns' for stage in stage_names]
+
+
+def _load_point_estimate(estimates_path: str):
+    """
+    Читает среднюю оценку времени этапа из estimates.json.
+
+    Returns:
+        Время этапа в наносекундах или None, если оценку получить не удалось.
+    """
+    try:
+        with open(estimates_path, 'rb') as f:
+            point_estimate = orjson.loads(f.read()).get("mean", {}).get("point_estimate")
+        # Сложение выполняется вне этой функции, поэтому тип проверяется здесь
+        if point_estimate is not None and not isinstance(point_estimate, (int, float)):
+            raise TypeError(f"point_estimate не является числом: {point_estimate!r}")
+        return point_estimate
+    except Exception as e:
+        print(f"Предупреждение: Не удалось обработать '{estimates_path}'. Ошибка: {e}")
+        return None
+
+
+def scan_criterion_tree(criterion_root: str):
+    """
+    Находит файлы с оценками Criterion, не читая их содержимого.
+
+    Returns:
+        Список вида: [('имя_группы', [('имя_этапа', путь_к_estimates.json, mtime_нс), ...]), ...]
+    """
+    if not os.path.isdir(criterion_root):
+        print(f"Ошибка: Директория '{criterion_root}' не найдена. Запустите 'cargo bench' сначала.")
+        return None
+
+    with os.scandir(criterion_root) as entries:
+        group_entries = [e for e in entries if e.is_dir(follow_symlinks=False)]
+
+    # Раскладка Criterion фиксирована: <группа>/<этап>/base/estimates.json,
+    # поэтому вместо полного обхода дерева спускаемся сразу на нужную глубину.
+    layout = []
+    for group_entry in group_entries:
+        stages = []
+        with os.scandir(group_entry.path) as stage_entries:
+            for stage_entry in stage_entries:
+                if stage_entry.is_dir(follow_symlinks=False):
+                    estimates_path = os.path.join(stage_entry.path, 'base', 'estimates.json')
+                    try:
+                        estimates_mtime = os.stat(estimates_path).st_mtime_ns
+                    except OSError:
+                        # Служебные директории (например, report) не содержат оценок
+                        continue
+                    stages.append((stage_entry.name, estimates_path, estimates_mtime))
+        if stages:
+            layout.append((group_entry.name, stages))
+
+    if not layout:
+        print("Ошибка: Не найдено валидных данных для анализа.")
+        return None
+
+    return layout
+
+
+def iter_groups(layout: list, stage_index: dict):
+    """
+    Читает оценки и по одной отдает группы в порядке layout.
+
+    Args:
+        layout: Результат scan_criterion_tree.
+        stage_index: Отображение имени этапа в номер столбца.
+
+    Yields:
+        Кортежи вида: ('имя_группы', массив времен этапов в нс по номерам из stage_index,
+        число успешно прочитанных файлов оценок)
+    """
+    # Файлы маленькие, и время уходит в основном на ожидание диска,
+    # поэтому чтение и разбор выполняются параллельно в пуле потоков.
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit(group):
+            group_name, stages = group
+            return group_name, [(stage_name, executor.submit(_load_point_estimate, path)) for stage_name, path, _ in stages]
+
+        # В работе держится ограниченное окно групп: следующая группа отправляется
+        # в пул, когда забирается очередная, а не все файлы дерева сразу.
+        groups = iter(layout)
+        pending = deque(submit(group) for group in itertools.islice(groups, max_workers))
+        while pending:
+            group_name, futures = pending.popleft()
+            next_group = next(groups, None)
+            if next_group is not None:
+                pending.append(submit(next_group))
+
+            stage_totals = np.zeros(len(stage_index), dtype=np.float64)
+            loaded = 0
+            for stage_name, future in futures:
+                point_estimate = future.result()
+                if point_estimate is not None:
+                    stage_totals[stage_index[stage_name]] += point_estimate
+                    loaded += 1
+
+            if loaded:
+                yield group_name, stage_totals, loaded
+
+
+def _cache_key(criterion_root: str, layout: list) -> dict:
+    """
+    Формирует метаданные, привязывающие Parquet-кэш к конкретному дереву Criterion.
+    """
+    estimates = [(path, mtime) for _, stages in layout for _, path, mtime in stages]
+    estimates_paths = [os.path.relpath(path, criterion_root) for path, _ in estimates]
+    estimates_mtimes = [mtime for _, mtime in estimates]
+    return {
+        b'criterion_root': os.path.realpath(criterion_root).encode('utf-8'),
+        b'estimates_paths': json.dumps(estimates_paths, ensure_ascii=False).encode('utf-8'),
+        # mtime сверяются на точное совпадение, а не с mtime кэша: файл, перезаписанный
+        # между чтением и сохранением кэша, иначе выглядел бы неизмененным
+        b'estimates_mtimes': json.dumps(estimates_mtimes).encode('utf-8'),
+    }
+
+
+def _load_cached_timings(parquet_path: str, cache_key: dict, layout: list, header: list):
+    """
+    Загружает тайминги из Parquet-файла, сохраненного предыдущим запуском.
+
+    Кэш используется, только если он построен по тому же корню Criterion и тем же
+    файлам оценок с теми же mtime и содержит те же этапы и ровно те же группы,
+    что и layout.
+
+    Returns:
+        Кортеж (имена_групп, матрица_времен) или None, если кэш нельзя использовать.
+    """
+    if pq is None:
+        return None
+
+    if not os.path.isfile(parquet_path):
+        return None
+
+    try:
+        # pq.read_table и to_numpy() импортируют pandas, поэтому таблица читается
+        # через ParquetFile, а столбцы переводятся в NumPy из списков
+        with pq.ParquetFile(parquet_path) as parquet_file:
+            table = parquet_file.read()
+    except Exception as e:
+        print(f"Предупреждение: Не удалось прочитать '{parquet_path}'. Ошибка: {e}")
+        return None
+
+    metadata = table.schema.metadata or {}
+    if any(metadata.get(key) != value for key, value in cache_key.items()):
+        return None
+
+    if table.column_names != header:
+        return None
+
+    group_names = table.column('pair').to_pylist()
+    if group_names != [group_name for group_name, _ in layout]:
+        return None
+
+    stage_times = np.column_stack([table.column(name).to_pylist() for name in header[2:]])
+    return group_names, stage_times
+
+
+def _save_timings_parquet(parquet_path: str, cache_key: dict, header: list, group_names: list,
+                          stage_times: np.ndarray):
+    """
+    Сохраняет сырые тайминги в Parquet для быстрых повторных запусков.
+    """
+    columns = [pa.array(group_names, pa.string()), stage_times.sum(axis=1)]
+    columns += [stage_times[:, i] for i in range(stage_times.shape[1])]
+    table = pa.table(columns, names=header).replace_schema_metadata(cache_key)
+    try:
+        os.makedirs(os.path.dirname(parquet_path) or '.', exist_ok=True)
+        pq.write_table(table, parquet_path, compression='zstd')
+    except Exception as e:
+        # Кэш необязателен, отчеты строятся и без него
+        print(f"Предупреждение: Не удалось сохранить '{parquet_path}'. Ошибка: {e}")
+        return
+    print(f"Сырые тайминги сохранены в '{parquet_path}'")
+
+
+@functools.lru_cache(maxsize=None)
+def load_criterion(criterion_root: str, cache_dir: str):
+    """
+    Собирает сырые данные о времени выполнения для каждой группы и ее этапов.
+
+    Результат кэшируется: в пределах одного процесса повторный вызов с теми же
+    аргументами не обращается к диску, а между запусками используется
+    timings_raw.parquet из cache_dir.
+
+    Returns:
+        Кортеж (имена_групп, имена_этапов, матрица_времен) или None, если данных нет.
+        Матрица имеет форму (группы, этапы) и доступна только для чтения.
+    """
+    layout = scan_criterion_tree(criterion_root)
+    if not layout:
+        return None
+
+    stage_names = sorted({stage_name for _, stages in layout for stage_name, _, _ in stages})
+    header = _raw_header(stage_names)
+    parquet_path = os.path.join(cache_dir, 'timings_raw.parquet')
+    cache_key = _cache_key(criterion_root, layout)
+
+    cached = _load_cached_timings(parquet_path, cache_key, layout, header)
+    if cached is not None:
+        print(f"Тайминги загружены из '{parquet_path}', файлы оценок не изменились.")
+        group_names, stage_times = cached
+    else:
+        stage_index = {stage_name: i for i, stage_name in enumerate(stage_names)}
+        group_names = []
+        stage_times = np.zeros((len(layout), len(stage_names)), dtype=np.float64)
+        loaded_estimates = 0
+        for group_name, times, loaded in iter_groups(layout, stage_index):
+            stage_times[len(group_names)] = times
+            group_names.append(group_name)
+            loaded_estimates += loaded
+        stage_times = stage_times[:len(group_names)]
+
+    if not group_names:
+        print("Ошибка: Не найдено валидных данных для анализа.")
+        return None
+
+    print(f"Найдено и обработано {len(group_names)} групп бенчмарков.")
+
+    # Если часть файлов не прочиталась, кэш не пишется: после исправления файла
+    # его mtime может не измениться, и кэш навсегда остался бы неполным
+    total_estimates = sum(len(stages) for _, stages in layout)
+    if pq is not None and cached is None and loaded_estimates == total_estimates:
+        _save_timings_parquet(parquet_path, cache_key, header, group_names, stage_times)
+
+    # Результат разделяется между вызовами через кэш, поэтому защищаем его от изменений
+    stage_times.setflags(write=False)
+    return tuple(group_names), tuple(stage_names), stage_times
+
+
+def generate_reports(timings: tuple, output_dir: str, round_digits: Optional[int] = None):
+    """
+    Генерирует два CSV-файла и данные для итоговой диаграммы.
+
+    Args:
+        timings: Результат load_criterion.
+        output_dir: Директория для сохранения отчетов.
+        round_digits: Число знаков после запятой для сырых таймингов (None - без округления).
+
+    Returns:
+        Список пар (имя_этапа, средний_процент) для итоговой диаграммы.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    group_names, stage_names, stage_times = timings
+    total_times = stage_times.sum(axis=1)
+
+    # --- CSV №1: Сырые тайминги ---
+    raw_values = np.column_stack([total_times, stage_times])
+    if round_digits is not None:
+        raw_values = np.round(raw_values, round_digits)
+
+    csv1_path = os.path.join(output_dir, 'timings_raw.csv')
+    header = _raw_header(stage_names)
+    with open(csv1_path, 'w', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows([group_name] + row.tolist() for group_name, row in zip(group_names, raw_values))
+
+    print(f"Отчет с сырыми таймингами сохранен в '{csv1_path}'")
+
+    # --- CSV №2: Анализ процентов ---
+    # Группы с нулевым суммарным временем в статистику не попадают
+    valid = total_times > 0
+    if valid.any():
+        percentages = stage_times[valid] / total_times[valid, None] * 100
+        min_ps, max_ps, avg_ps = percentages.min(axis=0), percentages.max(axis=0), percentages.mean(axis=0)
+    else:
+        min_ps = max_ps = avg_ps = np.zeros(len(stage_names))
+
+    csv2_path = os.path.join(output_dir, 'percentage_summary.csv')
+    summary_for_chart = list(zip(stage_names, avg_ps.tolist()))
+    with open(csv2_path, 'w', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        writer.writerow(['stage', 'min_percentage', 'max_percentage', 'avg_percentage'])
+        writer.writerows(
+            [stage_name, f"{min_p:.2f}", f"{max_p:.2f}", f"{avg_p:.2f}"]
+            for stage_name, min_p, max_p, avg_p in zip(stage_names, min_ps.tolist(), max_ps.tolist(), avg_ps.tolist())
+        )
+
+    print(f"Сводный отчет по процентам сохранен в '{csv2_path}'")
+    return summary_for_chart
+
+
+def setup_matplotlib(hatch_linewidth: float):
+    """
+    Импортирует и настраивает matplotlib для сохранения графиков в PDF.
+
+    Args:
+        hatch_linewidth: Толщина линий штриховки.
+
+    Returns:
+        Модуль matplotlib.pyplot.
+    """
+    # matplotlib импортируется только при построении графика
+    import matplotlib
+
+    # Графики только сохраняются в файл, интерактивный бэкенд не нужен
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    matplotlib.rcParams.update({
+        'pdf.fonttype': 42,
+        'pdf.compression': 9,
+        'path.simplify': True,
+        'path.simplify_threshold': 1.0,
+        'agg.path.chunksize': 10000,
+    })
+    # В PDF штриховка записывается как повторяющийся шаблон (по одному на стиль и цвет),
+    # поэтому тонкие линии не увеличивают ни размер файла, ни время сохранения
+    matplotlib.rcParams['hatch.linewidth'] = hatch_linewidth
+    return plt